@@ -0,0 +1,50 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Define the startup cases we want to track. Each case is a snippet run in a fresh interpreter, which mirrors what a
+# single (sharded) invocation of a generator script pays before it produces its first record.
+STARTUP_CASES = {
+    'interpreter': 'pass',
+    'products': 'from datagen import products',
+    'stockedby': 'from datagen import stockedby',
+    'users': 'from datagen import users, utility\n'
+             'utility.build_fake_data_generator(users.FAKER_PROVIDERS, 0)',
+    'stores': 'from datagen import stores, utility\n'
+              'utility.build_fake_data_generator(stores.FAKER_PROVIDERS, 0)',
+    'orders': 'from datagen import orders, utility\n'
+              'utility.build_fake_data_generator(orders.FAKER_PROVIDERS, 0)',
+    'validate': 'from datagen import validate',
+
+    # For reference, this is what each script used to pay: a Faker instance with all providers loaded.
+    'faker.Faker()': 'import faker\n'
+                     'faker.Faker()'
+}
+
+
+def time_startup(snippet, repeats):
+    # Run our snippet in a new interpreter (from the top-level directory) and return the wall time of each run.
+    top_level_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = {**os.environ, 'PYTHONPATH': top_level_directory}
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', snippet], cwd=top_level_directory, env=environment, check=True)
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the startup time of each generator script.')
+    parser.add_argument('--repeats', type=int, default=20, help='Number of times to start each case.')
+    parser.add_argument('--cases', nargs='*', default=list(STARTUP_CASES), help='Subset of cases to benchmark.')
+    arguments = parser.parse_args()
+
+    print('{:<16} {:>12} {:>12} {:>12}'.format('case', 'median (ms)', 'min (ms)', 'max (ms)'))
+    for case in arguments.cases:
+        case_timings = time_startup(STARTUP_CASES[case], arguments.repeats)
+        print('{:<16} {:>12.1f} {:>12.1f} {:>12.1f}'.format(case, statistics.median(case_timings) * 1000,
+                                                           min(case_timings) * 1000, max(case_timings) * 1000))
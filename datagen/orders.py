@@ -1,12 +1,12 @@
 import argparse
+import contextlib
 import datetime
+import heapq
+import itertools
 import json
 import os
 import random
 import time
-import decimal
-
-import faker
 
 from datagen import utility
 
@@ -16,6 +16,12 @@ NULLABLE_FIELDS = ['time_fulfilled', 'pickup_time']
 MISSABLE_FIELDS = ['time_fulfilled', 'pickup_time']
 ALL_FIELDS = [f for f in set(REQUIRED_FIELDS + NULLABLE_FIELDS + MISSABLE_FIELDS) if '.' not in f]
 
+# Define the Faker providers used in our post-processing step. Only these are loaded into our Faker instance.
+FAKER_PROVIDERS = ['date_time']
+
+# Define the lifecycle events of an order, and the field that holds the time of each event.
+ORDER_EVENTS = [('placed', 'time_placed'), ('picked_up', 'pickup_time'), ('fulfilled', 'time_fulfilled')]
+
 # Define the **valued** distribution for each field. These must match the fields above.
 VALUED_DISTRIBUTIONS = {
     # Each value in this dictionary is a function with all user IDs as the first argument (u), a store ID as the second
@@ -40,13 +46,15 @@ VALUED_DISTRIBUTIONS = {
         func=lambda: {**{
             'item_id': utility.get_unique_id('order.item', id_length=5),
             'qty': random.randint(1, 10)
-            # Note: prices have a null distribution defined in the utility function below.
+            # Note: prices have a null distribution defined in the utility function below, and are kept in integer
+            # cents until the order is serialized in the post-processing.
         }, **utility.product_to_order_item(random.choice(p))},
         success_prob=lambda: random.random() > 0.8,
         minimum_times=1
     ),
 
-    # The total price associated with an order. This is a derived attribute, and is also handled in the post-processing.
+    # The total price associated with an order. This is a derived attribute, and is computed (in integer cents) from all
+    # of the order's items once the order is built.
     'total_price': lambda u, s, p: 1
 }
 
@@ -68,7 +76,8 @@ MISSING_DISTRIBUTIONS = {
 }
 
 
-def generate_orders(order_count, users_file, stocked_file, products_file, output_file):
+def generate_orders(order_count, users_file, stocked_file, products_file, output_file,
+                    queue_depth=utility.WRITER_QUEUE_DEPTH):
     # We store all user IDs and each store's catalog in memory.
     user_ids = list()
     with open(users_file, 'r') as users_fp:
@@ -94,26 +103,46 @@ def generate_orders(order_count, users_file, stocked_file, products_file, output
         store_stock.append(tuple((k, v)))
     del store_stock_group
 
-    with open(output_file, 'w') as output_fp:
+    build_order = utility.compile_record_builder(ALL_FIELDS, VALUED_DISTRIBUTIONS, NULL_DISTRIBUTIONS,
+                                                 MISSING_DISTRIBUTIONS, ['u', 's', 'p'])
+
+    with open(output_file, 'w') as output_fp, utility.BackgroundWriter(output_fp, queue_depth) as output_writer:
         for _ in range(order_count):
-            orders_dict = {}
             store_id, product_pairs = random.choice(store_stock)
-            for field in ALL_FIELDS:
-                orders_dict[field] = VALUED_DISTRIBUTIONS[field](user_ids, store_id, product_pairs)
-            utility.insert_missing_or_null(orders_dict, NULL_DISTRIBUTIONS, MISSING_DISTRIBUTIONS)
-            json.dump(orders_dict, output_fp)
-            output_fp.write('\n')
-
-
-def enhance_orders(input_file, date_range, growth_intervals, total_count, fake_data_generator, output_file):
-    # We define the following to compute the total price attribute (we keep SQL's SUM NULL semantics here).
-    def find_total_price(items):
-        total_price = decimal.Decimal(0)
-        for item in items:
-            if item['price'] is not None:
-                total_price += decimal.Decimal(item['price'] * item['qty'])
-        return float(total_price.quantize(decimal.Decimal('0.01'), decimal.ROUND_HALF_UP))
+            orders_dict = build_order(user_ids, store_id, product_pairs)
+            orders_dict['total_price'] = utility.order_items_to_total_cents(orders_dict['items'])
+            output_writer.write(json.dumps(orders_dict) + '\n')
+    return output_writer.stats
+
 
+class OrderEventLog:
+    def __init__(self, event_writer):
+        # Our orders are written in time_placed order, and each order's other events occur after it was placed. Events
+        # wait in a min-heap until an order placed at (or after) their time is seen, so the heap only holds the events
+        # of orders placed in the last pickup + fulfillment window (at most 12 hours) instead of all events.
+        self.event_writer = event_writer
+        self.pending_events = []
+        self.sequence = itertools.count()
+
+    def push(self, order_json, event_datetimes):
+        for event, field in ORDER_EVENTS:
+            if order_json.get(field) is not None:
+                heapq.heappush(self.pending_events, (event_datetimes[field], next(self.sequence), {
+                    'order_id': order_json['order_id'],
+                    'user_id': order_json['user_id'],
+                    'store_id': order_json['store_id'],
+                    'event': event,
+                    'event_time': order_json[field]
+                }))
+
+    def flush(self, watermark=None):
+        # Write all events that occur at or before our watermark (or all events, if no watermark is given).
+        while self.pending_events and (watermark is None or self.pending_events[0][0] <= watermark):
+            self.event_writer.write(json.dumps(heapq.heappop(self.pending_events)[2]) + '\n')
+
+
+def enhance_orders(input_file, date_range, growth_intervals, total_count, fake_data_generator, output_file,
+                   queue_depth=utility.WRITER_QUEUE_DEPTH, event_log_file=None):
     # Determine the size of our time intervals.
     growth_delta = datetime.timedelta(days=(date_range[1] - date_range[0]).days / growth_intervals)
     time_increments = []
@@ -136,7 +165,14 @@ def enhance_orders(input_file, date_range, growth_intervals, total_count, fake_d
     assert sum(t['count'] for t in time_increments) < total_count
 
     total_number_of_orders_placed = 0
-    with open(input_file, 'r') as input_fp, open(output_file, 'w') as output_fp:
+    with open(input_file, 'r') as input_fp, open(output_file, 'w') as output_fp, \
+         utility.BackgroundWriter(output_fp, queue_depth) as output_writer, contextlib.ExitStack() as event_stack:
+        # If requested, we also write the events of each order (in event time order) to a separate log.
+        event_log = None
+        if event_log_file is not None:
+            event_log_fp = event_stack.enter_context(open(event_log_file, 'w'))
+            event_log = OrderEventLog(event_stack.enter_context(utility.BackgroundWriter(event_log_fp, queue_depth)))
+
         # Build our growth.
         for i in range(growth_intervals):
             number_of_orders_in_time_period = int(round(time_increments[i]['count']))
@@ -158,14 +194,16 @@ def enhance_orders(input_file, date_range, growth_intervals, total_count, fake_d
             for d in sorted(generated_datetimes, key=lambda a: a['time_placed']):
                 line = input_fp.readline()
                 order_json = json.loads(line)
-                order_json['total_price'] = find_total_price(order_json['items'])
+                utility.finalize_order_prices(order_json)
                 order_json['time_placed'] = d['time_placed'].isoformat() + '.000Z'
                 if 'pickup_time' in order_json:
                     order_json['pickup_time'] = d['pickup_time'].isoformat() + '.000Z'
                 order_json['time_fulfilled'] = d['time_fulfilled'].isoformat() + '.000Z'
-                output_fp.write(json.dumps(order_json))
-                output_fp.write('\n')
+                output_writer.write(json.dumps(order_json) + '\n')
                 last_datetime = d['time_placed']
+                if event_log is not None:
+                    event_log.push(order_json, d)
+                    event_log.flush(d['time_placed'])
 
         # If we still haven't exhausted all of orders, generate additional times.
         generated_datetimes = []
@@ -184,14 +222,19 @@ def enhance_orders(input_file, date_range, growth_intervals, total_count, fake_d
         for d in sorted(generated_datetimes, key=lambda a: a['time_placed']):
             line = input_fp.readline()
             order_json = json.loads(line)
-            order_json['total_price'] = find_total_price(order_json['items'])
+            utility.finalize_order_prices(order_json)
             order_json['time_placed'] = d['time_placed'].isoformat() + '.000Z'
             if 'pickup_time' in order_json:
                 order_json['pickup_time'] = d['pickup_time'].isoformat() + '.000Z'
             if 'time_fulfilled' in order_json:
                 del order_json['time_fulfilled']
-            output_fp.write(json.dumps(order_json))
-            output_fp.write('\n')
+            output_writer.write(json.dumps(order_json) + '\n')
+            if event_log is not None:
+                event_log.push(order_json, d)
+                event_log.flush(d['time_placed'])
+        if event_log is not None:
+            event_log.flush()
+    return output_writer.stats
 
 
 if __name__ == '__main__':
@@ -207,19 +250,30 @@ if __name__ == '__main__':
     parser.add_argument('--products_file', required=True, help='Location of the input Products dataset.')
     parser.add_argument('--output_file', default='orders.json', help='Location of the output Orders dataset.')
     parser.add_argument('--random_seed', default=0, help='Seed used for Faker and the random package.')
+    parser.add_argument('--event_log_file', default=None,
+                        help='Location of the (optional) output order event log, in event time order.')
+    parser.add_argument('--writer_queue_depth', type=int, default=utility.WRITER_QUEUE_DEPTH,
+                        help='Number of encoded chunks that can wait to be written.')
+    parser.add_argument('--writer_stats', action='store_true', help='Print the stats of our writer thread.')
     arguments = parser.parse_args()
 
     # Seed our RNG.
-    faker.Faker.seed(arguments.random_seed)
+    fake_data_generator = utility.build_fake_data_generator(FAKER_PROVIDERS, arguments.random_seed)
     random.seed(arguments.random_seed)
 
     # Generate our orders without growth.
-    generate_orders(arguments.order_count, arguments.users_file, arguments.stocked_file, arguments.products_file,
-                    arguments.output_file + '.tmp')
+    writer_stats = generate_orders(arguments.order_count, arguments.users_file, arguments.stocked_file,
+                                   arguments.products_file, arguments.output_file + '.tmp',
+                                   arguments.writer_queue_depth)
+    if arguments.writer_stats:
+        utility.print_writer_stats(arguments.output_file + '.tmp', writer_stats)
     time.sleep(5)
 
     # Add growth to our orders.
     argument_order_interval = [arguments.order_start_date, arguments.order_end_date]
-    enhance_orders(arguments.output_file + '.tmp', argument_order_interval, arguments.growth_intervals,
-                   arguments.order_count, faker.Faker(), arguments.output_file)
+    writer_stats = enhance_orders(arguments.output_file + '.tmp', argument_order_interval, arguments.growth_intervals,
+                                  arguments.order_count, fake_data_generator, arguments.output_file,
+                                  arguments.writer_queue_depth, arguments.event_log_file)
+    if arguments.writer_stats:
+        utility.print_writer_stats(arguments.output_file, writer_stats)
     os.remove(arguments.output_file + '.tmp')
@@ -2,7 +2,6 @@ import argparse
 import json
 import os
 import random
-import faker
 
 from datagen import utility
 
@@ -43,31 +42,35 @@ MISSING_DISTRIBUTIONS = {
 }
 
 
-def generate_products(product_files, output_file):
-    with open(output_file, 'w') as output_fp:
+def generate_products(product_files, output_file, queue_depth=utility.WRITER_QUEUE_DEPTH):
+    build_product = utility.compile_record_builder(ALL_FIELDS, VALUED_DISTRIBUTIONS, NULL_DISTRIBUTIONS,
+                                                   MISSING_DISTRIBUTIONS, ['p', 'f'])
+
+    with open(output_file, 'w') as output_fp, utility.BackgroundWriter(output_fp, queue_depth) as output_writer:
         for product_file in os.listdir(product_files):
             with open(product_files + product_file) as working_fp:
                 working_json = json.load(working_fp)
 
             for product in working_json['response']['docs']:
-                product_dict = {}
-                for field in ALL_FIELDS:
-                    product_dict[field] = VALUED_DISTRIBUTIONS[field](product, product_file)
-                utility.insert_missing_or_null(product_dict, NULL_DISTRIBUTIONS, MISSING_DISTRIBUTIONS)
-                json.dump(product_dict, output_fp)
-                output_fp.write('\n')
+                product_dict = build_product(product, product_file)
+                output_writer.write(json.dumps(product_dict) + '\n')
+    return output_writer.stats
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Generate the Products dataset.')
     parser.add_argument('--output_file', default='products.json', help='Location of the output Products dataset.')
-    parser.add_argument('--random_seed', default=0, help='Seed used for Faker and the random package.')
+    parser.add_argument('--random_seed', default=0, help='Seed used for the random package.')
     parser.add_argument('--product_files', default='external/products/', help='Location of the scraped product files.')
+    parser.add_argument('--writer_queue_depth', type=int, default=utility.WRITER_QUEUE_DEPTH,
+                        help='Number of encoded chunks that can wait to be written.')
+    parser.add_argument('--writer_stats', action='store_true', help='Print the stats of our writer thread.')
     arguments = parser.parse_args()
 
     # Seed our RNG.
-    faker.Faker.seed(arguments.random_seed)
     random.seed(arguments.random_seed)
 
     # Generate our products.
-    generate_products(arguments.product_files, arguments.output_file)
+    writer_stats = generate_products(arguments.product_files, arguments.output_file, arguments.writer_queue_depth)
+    if arguments.writer_stats:
+        utility.print_writer_stats(arguments.output_file, writer_stats)
@@ -1,7 +1,6 @@
 import argparse
 import json
 import random
-import faker
 
 from datagen import utility
 
@@ -34,9 +33,12 @@ MISSING_DISTRIBUTIONS = {
 }
 
 
-def generate_stocked(products_file, stores_file, stocked_prob, output_file):
+def generate_stocked(products_file, stores_file, stocked_prob, output_file, queue_depth=utility.WRITER_QUEUE_DEPTH):
+    build_stocked = utility.compile_record_builder(ALL_FIELDS, VALUED_DISTRIBUTIONS, NULL_DISTRIBUTIONS,
+                                                   MISSING_DISTRIBUTIONS, ['p', 's'])
+
     with open(output_file, 'w') as output_fp, open(products_file, 'r') as products_fp,\
-         open(stores_file, 'r') as stores_fp:
+         open(stores_file, 'r') as stores_fp, utility.BackgroundWriter(output_fp, queue_depth) as output_writer:
         for store in stores_fp:
             store_json = json.loads(store)
             if 'categories' in store_json:
@@ -49,12 +51,9 @@ def generate_stocked(products_file, stores_file, stocked_prob, output_file):
                 product_category = product_json['category']
                 should_product_be_in_store = store_categories is None or product_category in store_categories
                 if random.random() < stocked_prob and should_product_be_in_store:
-                    stocked_dict = {}
-                    for field in ALL_FIELDS:
-                        stocked_dict[field] = VALUED_DISTRIBUTIONS[field](product_json, store_json)
-                    utility.insert_missing_or_null(stocked_dict, NULL_DISTRIBUTIONS, MISSING_DISTRIBUTIONS)
-                    json.dump(stocked_dict, output_fp)
-                    output_fp.write('\n')
+                    stocked_dict = build_stocked(product_json, store_json)
+                    output_writer.write(json.dumps(stocked_dict) + '\n')
+    return output_writer.stats
 
 
 if __name__ == '__main__':
@@ -63,12 +62,17 @@ if __name__ == '__main__':
     parser.add_argument('--stores_file', required=True, help='Location of the input Stores dataset.')
     parser.add_argument('--stocked_prob', type=float, default=0.95, help='Probability that a store stocks a product.')
     parser.add_argument('--output_file', default='stockedby.json', help='Location of the output StockedBy dataset.')
-    parser.add_argument('--random_seed', default=0, help='Seed used for Faker and the random package.')
+    parser.add_argument('--random_seed', default=0, help='Seed used for the random package.')
+    parser.add_argument('--writer_queue_depth', type=int, default=utility.WRITER_QUEUE_DEPTH,
+                        help='Number of encoded chunks that can wait to be written.')
+    parser.add_argument('--writer_stats', action='store_true', help='Print the stats of our writer thread.')
     arguments = parser.parse_args()
 
     # Seed our RNG.
-    faker.Faker.seed(arguments.random_seed)
     random.seed(arguments.random_seed)
 
     # Generate our stockedby.
-    generate_stocked(arguments.products_file, arguments.stores_file, arguments.stocked_prob, arguments.output_file)
+    writer_stats = generate_stocked(arguments.products_file, arguments.stores_file, arguments.stocked_prob,
+                                    arguments.output_file, arguments.writer_queue_depth)
+    if arguments.writer_stats:
+        utility.print_writer_stats(arguments.output_file, writer_stats)
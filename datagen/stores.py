@@ -1,7 +1,6 @@
 import argparse
 import json
 import random
-import faker
 import csv
 
 from datagen import utility
@@ -12,6 +11,10 @@ NULLABLE_FIELDS = []
 MISSABLE_FIELDS = ['address.zip_code', 'categories']
 ALL_FIELDS = [f for f in set(REQUIRED_FIELDS + NULLABLE_FIELDS + MISSABLE_FIELDS) if '.' not in f]
 
+# Define the Faker providers used by the distributions below. Only these are loaded into our Faker instance (our
+# street addresses are built from names, hence the person provider).
+FAKER_PROVIDERS = ['address', 'person', 'phone_number']
+
 # Define the **valued** distribution for each field. These must match the fields above.
 VALUED_DISTRIBUTIONS = {
     # Each value in this dictionary is a function with the Faker data generator as the first argument (f) and a
@@ -57,21 +60,23 @@ MISSING_DISTRIBUTIONS = {
 }
 
 
-def generate_stores(stores_count, zip_code_file, fake_data_generator, output_file):
+def generate_stores(stores_count, zip_code_file, fake_data_generator, output_file,
+                    queue_depth=utility.WRITER_QUEUE_DEPTH):
     zip_codes = []
     with open(zip_code_file, newline='') as f:
         zip_code_reader = csv.DictReader(f)
         for row in zip_code_reader:
             zip_codes.append(row)
 
-    with open(output_file, 'w') as output_fp:
+    # Each field is given its own random zip code row.
+    build_store = utility.compile_record_builder(ALL_FIELDS, VALUED_DISTRIBUTIONS, NULL_DISTRIBUTIONS,
+                                                 MISSING_DISTRIBUTIONS, ['f', 'z'], ['f', 'random.choice(z)'])
+
+    with open(output_file, 'w') as output_fp, utility.BackgroundWriter(output_fp, queue_depth) as output_writer:
         for _ in range(stores_count):
-            stores_dict = {}
-            for field in ALL_FIELDS:
-                stores_dict[field] = VALUED_DISTRIBUTIONS[field](fake_data_generator, random.choice(zip_codes))
-            utility.insert_missing_or_null(stores_dict, NULL_DISTRIBUTIONS, MISSING_DISTRIBUTIONS)
-            json.dump(stores_dict, output_fp)
-            output_fp.write('\n')
+            stores_dict = build_store(fake_data_generator, zip_codes)
+            output_writer.write(json.dumps(stores_dict) + '\n')
+    return output_writer.stats
 
 
 if __name__ == '__main__':
@@ -80,11 +85,17 @@ if __name__ == '__main__':
     parser.add_argument('--output_file', default='stores.json', help='Location of the output Stores dataset.')
     parser.add_argument('--random_seed', default=0, help='Seed used for Faker and the random package.')
     parser.add_argument('--zip_code_file', default='external/zip-code-data.csv', help='Location of the zip-code CSV.')
+    parser.add_argument('--writer_queue_depth', type=int, default=utility.WRITER_QUEUE_DEPTH,
+                        help='Number of encoded chunks that can wait to be written.')
+    parser.add_argument('--writer_stats', action='store_true', help='Print the stats of our writer thread.')
     arguments = parser.parse_args()
 
     # Seed our RNG.
-    faker.Faker.seed(arguments.random_seed)
+    fake_data_generator = utility.build_fake_data_generator(FAKER_PROVIDERS, arguments.random_seed)
     random.seed(arguments.random_seed)
 
     # Generate our stores.
-    generate_stores(arguments.store_count, arguments.zip_code_file, faker.Faker(), arguments.output_file)
+    writer_stats = generate_stores(arguments.store_count, arguments.zip_code_file, fake_data_generator,
+                                   arguments.output_file, arguments.writer_queue_depth)
+    if arguments.writer_stats:
+        utility.print_writer_stats(arguments.output_file, writer_stats)
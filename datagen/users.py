@@ -1,7 +1,6 @@
 import argparse
 import json
 import random
-import faker
 
 from datagen import utility
 
@@ -11,6 +10,9 @@ NULLABLE_FIELDS = []
 MISSABLE_FIELDS = ['email', 'phones', 'kids']
 ALL_FIELDS = [f for f in set(REQUIRED_FIELDS + NULLABLE_FIELDS + MISSABLE_FIELDS) if '.' not in f]
 
+# Define the Faker providers used by the distributions below. Only these are loaded into our Faker instance.
+FAKER_PROVIDERS = ['person', 'phone_number']
+
 # Define the **valued** distribution for each field. These must match the fields above.
 VALUED_DISTRIBUTIONS = {
     # Each value in this dictionary is a function with the Faker data generator as the first argument (f) and the
@@ -62,17 +64,17 @@ MISSING_DISTRIBUTIONS = {
 }
 
 
-def generate_users(user_count, fake_data_generator, output_file):
-    with open(output_file, 'w') as output_fp:
-        for _ in range(user_count):
-            user_dict = {}
+def generate_users(user_count, fake_data_generator, output_file, queue_depth=utility.WRITER_QUEUE_DEPTH):
+    # The order of the fields matter here! Name must come before email.
+    field_order = [f for f in ALL_FIELDS if f != 'name' and f != 'email'] + ['name', 'email']
+    build_user = utility.compile_record_builder(field_order, VALUED_DISTRIBUTIONS, NULL_DISTRIBUTIONS,
+                                                MISSING_DISTRIBUTIONS, ['f'], ['f', 'record'])
 
-            # The order of the fields matter here! Name must come before email.
-            for field in [f for f in ALL_FIELDS if f != 'name' and f != 'email'] + ['name', 'email']:
-                user_dict[field] = VALUED_DISTRIBUTIONS[field](fake_data_generator, user_dict)
-            utility.insert_missing_or_null(user_dict, NULL_DISTRIBUTIONS, MISSING_DISTRIBUTIONS)
-            json.dump(user_dict, output_fp)
-            output_fp.write('\n')
+    with open(output_file, 'w') as output_fp, utility.BackgroundWriter(output_fp, queue_depth) as output_writer:
+        for _ in range(user_count):
+            user_dict = build_user(fake_data_generator)
+            output_writer.write(json.dumps(user_dict) + '\n')
+    return output_writer.stats
 
 
 if __name__ == '__main__':
@@ -80,11 +82,17 @@ if __name__ == '__main__':
     parser.add_argument('--user_count', type=int, default=5000, help='Number of users to generate.')
     parser.add_argument('--output_file', default='users.json', help='Location of the output Users dataset.')
     parser.add_argument('--random_seed', default=0, help='Seed used for Faker and the random package.')
+    parser.add_argument('--writer_queue_depth', type=int, default=utility.WRITER_QUEUE_DEPTH,
+                        help='Number of encoded chunks that can wait to be written.')
+    parser.add_argument('--writer_stats', action='store_true', help='Print the stats of our writer thread.')
     arguments = parser.parse_args()
 
     # Seed our RNG.
-    faker.Faker.seed(arguments.random_seed)
+    fake_data_generator = utility.build_fake_data_generator(FAKER_PROVIDERS, arguments.random_seed)
     random.seed(arguments.random_seed)
 
     # Generate our users.
-    generate_users(arguments.user_count, faker.Faker(), arguments.output_file)
+    writer_stats = generate_users(arguments.user_count, fake_data_generator, arguments.output_file,
+                                  arguments.writer_queue_depth)
+    if arguments.writer_stats:
+        utility.print_writer_stats(arguments.output_file, writer_stats)
@@ -1,7 +1,9 @@
 #!/usr/local/bin/python3
+import queue
 import random
 import string
-import decimal
+import threading
+import time
 
 
 STORE_NAMES = [
@@ -58,6 +60,10 @@ PHONE_TYPES = ['HOME', 'OFFICE', 'MOBILE']
 
 UNIQUE_ID_MAP = {}
 
+# The number of encoded chunks that can wait for our writer thread, and the (approximate) size of each chunk.
+WRITER_QUEUE_DEPTH = 8
+WRITER_CHUNK_SIZE = 1 << 16
+
 
 def products_filename_to_product_category(filename):
     return {
@@ -167,11 +173,21 @@ def user_name_to_user_email(first_name, last_name):
     return working_email + email_suffix
 
 
+def price_to_cents(price):
+    # Prices are carried as integer cents. We round half-up on the exact binary value of the float, which matches what
+    # decimal.Decimal(price).quantize(decimal.Decimal('0.01'), decimal.ROUND_HALF_UP) produces for non-negative prices.
+    numerator, denominator = price.as_integer_ratio()
+    return (200 * numerator + denominator) // (2 * denominator)
+
+
+def cents_to_price(cents):
+    # Floats are only produced here, right before a record is serialized.
+    return None if cents is None else cents / 100
+
+
 def product_to_order_item(product):
     if type(product[1]) is not str:
-        price = max(product[1] + (product[1] * random.random()) - (product[1] / 2.0), 0.99)
-        price = decimal.Decimal(price).quantize(decimal.Decimal('0.01'), decimal.ROUND_HALF_UP)
-        price = float(price)
+        price = price_to_cents(max(product[1] + (product[1] * random.random()) - (product[1] / 2.0), 0.99))
     else:
         price = None
     return {
@@ -180,6 +196,18 @@ def product_to_order_item(product):
     }
 
 
+def order_items_to_total_cents(items):
+    # We keep SQL's SUM NULL semantics here (NULL prices are skipped).
+    return sum(item['price'] * item['qty'] for item in items if item['price'] is not None)
+
+
+def finalize_order_prices(order):
+    # Convert the integer cents of each item (and the order total) back into floats for serialization.
+    for item in order['items']:
+        item['price'] = cents_to_price(item['price'])
+    order['total_price'] = cents_to_price(order['total_price'])
+
+
 def repeat_and_collect(func, success_prob=None, minimum_times=None, is_distinct=False):
     results = []
     if minimum_times is not None:
@@ -197,22 +225,29 @@ def repeat_and_collect(func, success_prob=None, minimum_times=None, is_distinct=
     return results
 
 
-def insert_missing_or_null(record, null_dist, missing_dist):
-    for k, v in null_dist.items():
-        if v():
-            key_steps = k.split('.')
-            working_dict = record
-            while len(key_steps) > 1:
-                working_dict = working_dict[key_steps.pop(0)]
-            working_dict[key_steps.pop(0)] = None
+def compile_record_builder(field_order, valued_dist, null_dist, missing_dist, builder_args, field_args=None):
+    # We generate the source of a single function that builds a record. The field order is fixed here, each valued
+    # function is called directly (without looking it up in valued_dist), and each "." path of the null / missing
+    # distributions is unrolled into subscripts. Each valued function is called with field_args (an expression list,
+    # evaluated per field, that may refer to builder_args and the record being built), which defaults to builder_args.
+    namespace = {'random': random}
+    field_args = ', '.join(builder_args if field_args is None else field_args)
+    source_lines = ['def build_record({}):'.format(', '.join(builder_args)), '    record = {}']
+    for i, field in enumerate(field_order):
+        namespace['valued_' + str(i)] = valued_dist[field]
+        source_lines.append('    record[{!r}] = valued_{}({})'.format(field, i, field_args))
+
+    # Note: all NULL fields are inserted before any fields are removed.
+    for prefix, dist, statement in [('null_', null_dist, '{} = None'), ('missing_', missing_dist, 'del {}')]:
+        for i, (path, predicate) in enumerate(dist.items()):
+            namespace[prefix + str(i)] = predicate
+            subscripts = ''.join('[{!r}]'.format(key_step) for key_step in path.split('.'))
+            source_lines.append('    if {}{}():'.format(prefix, i))
+            source_lines.append('        ' + statement.format('record' + subscripts))
+    source_lines.append('    return record')
 
-    for k, v in missing_dist.items():
-        if v():
-            key_steps = k.split('.')
-            working_dict = record
-            while len(key_steps) > 1:
-                working_dict = working_dict[key_steps.pop(0)]
-            del working_dict[key_steps.pop(0)]
+    exec(compile('\n'.join(source_lines) + '\n', '<record builder>', 'exec'), namespace)
+    return namespace['build_record']
 
 
 def get_unique_id(domain_key, id_length=5):
@@ -233,6 +268,14 @@ def get_unique_id(domain_key, id_length=5):
     return candidate_id
 
 
+def build_fake_data_generator(providers, random_seed, locale='en_US'):
+    # Importing Faker (and loading all of its providers) is expensive, so we only do so for the scripts that need it.
+    import faker
+
+    faker.Faker.seed(random_seed)
+    return faker.Faker(locale, providers=['faker.providers.' + p for p in providers])
+
+
 def generate_hours():
     hours_list = []
     for day in ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']:
@@ -241,3 +284,91 @@ def generate_hours():
                                'opens': random.choice(['8AM', '10AM', '12PM']),
                                'closes': random.choice(['4PM', '8PM', '10PM'])})
     return hours_list
+
+
+class BackgroundWriter:
+    def __init__(self, output_fp, queue_depth=WRITER_QUEUE_DEPTH, chunk_size=WRITER_CHUNK_SIZE):
+        # Records are buffered here until we have a full chunk, which is then handed to our writer thread. We fill a
+        # new buffer while the thread writes the old one, and the bounded queue stalls us if the thread falls behind.
+        self.output_fp = output_fp
+        self.chunk_size = chunk_size
+        self.chunk_queue = queue.Queue(maxsize=max(queue_depth, 1))
+        self.buffer = []
+        self.buffer_size = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self.stats = {
+            'chunks': 0,
+            'characters': 0,
+            'max_queued_chunks': 0,
+            'generator_stalls': 0,
+            'generator_stall_seconds': 0.0,
+            'writer_idle_seconds': 0.0
+        }
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # An exception raised in our with-block takes precedence over any error from our writer thread.
+        self.close(raise_error=exc_type is None)
+        return False
+
+    def _write_chunks(self):
+        while True:
+            start_time = time.perf_counter()
+            chunk = self.chunk_queue.get()
+            self.stats['writer_idle_seconds'] += time.perf_counter() - start_time
+            if chunk is None:
+                return
+
+            # After an error, we keep draining our queue so our generator never blocks on a full queue.
+            if self.error is None:
+                try:
+                    self.output_fp.write(chunk)
+                except Exception as e:
+                    self.error = e
+
+    def _flush_buffer(self):
+        chunk = ''.join(self.buffer)
+        self.buffer = []
+        self.buffer_size = 0
+        self.stats['chunks'] += 1
+        self.stats['characters'] += len(chunk)
+
+        try:
+            self.chunk_queue.put_nowait(chunk)
+        except queue.Full:
+            start_time = time.perf_counter()
+            self.chunk_queue.put(chunk)
+            self.stats['generator_stalls'] += 1
+            self.stats['generator_stall_seconds'] += time.perf_counter() - start_time
+        self.stats['max_queued_chunks'] = max(self.stats['max_queued_chunks'], self.chunk_queue.qsize())
+
+    def write(self, text):
+        if self.error is not None:
+            raise self.error
+        self.buffer.append(text)
+        self.buffer_size += len(text)
+        if self.buffer_size >= self.chunk_size:
+            self._flush_buffer()
+
+    def close(self, raise_error=True):
+        if not self.thread.is_alive():
+            return
+
+        # Our writer thread must always be stopped, even if flushing our last chunk fails.
+        try:
+            if self.buffer and self.error is None:
+                self._flush_buffer()
+        finally:
+            self.chunk_queue.put(None)
+            self.thread.join()
+        if raise_error and self.error is not None:
+            raise self.error
+
+
+def print_writer_stats(output_file, stats):
+    print('Writer stats for {}: {}'.format(output_file, ', '.join('{}={}'.format(
+        k, round(v, 3) if isinstance(v, float) else v) for k, v in stats.items())))
@@ -0,0 +1,262 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+
+from datagen import orders
+from datagen import products
+from datagen import stockedby
+from datagen import stores
+from datagen import users
+
+# Define the modules (and hence the null / missing distributions) associated with each dataset.
+DATASET_MODULES = {
+    'users': users,
+    'stores': stores,
+    'products': products,
+    'stockedby': stockedby,
+    'orders': orders
+}
+
+# Define the key(s) that must be unique within each reference dataset. These are also the keys our orders point to.
+REFERENCE_KEYS = {
+    'users': lambda r: r['user_id'],
+    'stores': lambda r: r['store_id'],
+    'products': lambda r: r['product_id'],
+    'stockedby': lambda r: r['store_id'] + '|' + r['product_id']
+}
+
+# We use these to label the state of a (possibly nested) field in a record.
+FIELD_PRESENT, FIELD_NULL, FIELD_MISSING = 0, 1, 2
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        # Size our filter to hold the given number of keys with the given false positive rate.
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.key_count = 0
+        self.bit_count = max(int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.hash_count = max(int(round(self.bit_count / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.bit_count + 7) // 8)
+
+    def _positions(self, key):
+        # We derive all of our bit positions from a single 128-bit digest (i.e. double hashing).
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, key):
+        # Returns true if the key was (possibly) already in our filter.
+        self.key_count = self.key_count + 1
+        was_present = True
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                was_present = False
+        return was_present
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def effective_error_rate(self):
+        return (1 - math.exp(-self.hash_count * self.key_count / self.bit_count)) ** self.hash_count
+
+
+def estimate_record_count(input_file, sample_size=1 << 20):
+    # Extrapolate the number of lines in our file from the first sample_size bytes (with some headroom).
+    file_size = os.path.getsize(input_file)
+    with open(input_file, 'rb') as input_fp:
+        sample = input_fp.read(sample_size)
+    if len(sample) == file_size:
+        return max(sample.count(b'\n'), 1)
+    return int(file_size / len(sample) * max(sample.count(b'\n'), 1) * 1.25) + 1
+
+
+def check_filter_capacity(report, filter_name, key_filter):
+    # Our record counts are only estimates, so we warn if a filter ended up holding more keys than it was sized for
+    # (i.e. its false positive rate is now above our --error_rate).
+    if key_filter.key_count > key_filter.capacity:
+        report['warnings'].append('{} filter holds {} keys but was sized for {} (false positive rate ~{:.2g})'.format(
+            filter_name, key_filter.key_count, key_filter.capacity, key_filter.effective_error_rate()))
+
+
+def resolve_field(record, key_steps):
+    working_dict = record
+    for key_step in key_steps:
+        if working_dict is None:
+            return FIELD_NULL
+        if key_step not in working_dict:
+            return FIELD_MISSING
+        working_dict = working_dict[key_step]
+    return FIELD_NULL if working_dict is None else FIELD_PRESENT
+
+
+def new_field_counts(dataset):
+    module = DATASET_MODULES[dataset]
+    return {f: {'key_steps': f.split('.'), 'null': 0, 'missing': 0}
+            for f in list(module.NULL_DISTRIBUTIONS) + list(module.MISSING_DISTRIBUTIONS)}
+
+
+def update_field_counts(field_counts, record):
+    for counts in field_counts.values():
+        field_state = resolve_field(record, counts['key_steps'])
+        if field_state == FIELD_NULL:
+            counts['null'] = counts['null'] + 1
+        elif field_state == FIELD_MISSING:
+            counts['missing'] = counts['missing'] + 1
+
+
+def scan_reference_file(dataset, input_file, error_rate):
+    key_function = REFERENCE_KEYS[dataset]
+    key_filter = BloomFilter(estimate_record_count(input_file), error_rate)
+    field_counts = new_field_counts(dataset)
+    report = {'dataset': dataset, 'records': 0, 'violations': {'duplicate keys': 0}, 'warnings': []}
+
+    with open(input_file, 'r') as input_fp:
+        for line in input_fp:
+            record = json.loads(line)
+            report['records'] = report['records'] + 1
+            if key_filter.add(key_function(record)):
+                report['violations']['duplicate keys'] += 1
+            update_field_counts(field_counts, record)
+
+    check_filter_capacity(report, 'key', key_filter)
+    report['field_counts'] = field_counts
+    return report, key_filter
+
+
+def scan_orders_file(input_file, key_filters, error_rate):
+    order_count = estimate_record_count(input_file)
+    order_filter = BloomFilter(order_count, error_rate)
+
+    # An order has one item, plus a geometric number of extra items (each with probability 0.2), so we expect 1.25
+    # items per order. We size our item filter for 1.5 items per order.
+    item_filter = BloomFilter(int(order_count * 1.5), error_rate)
+    field_counts = new_field_counts('orders')
+    report = {'dataset': 'orders', 'records': 0, 'violations': {
+        'duplicate order_id': 0,
+        'duplicate item_id': 0,
+        'unknown user_id': 0,
+        'unknown store_id': 0,
+        'unknown product_id': 0,
+        'product not stocked by store': 0,
+        'decreasing time_placed': 0
+    }, 'warnings': []}
+    violations = report['violations']
+
+    last_time_placed = None
+    with open(input_file, 'r') as input_fp:
+        for line in input_fp:
+            order = json.loads(line)
+            report['records'] = report['records'] + 1
+            if order_filter.add(order['order_id']):
+                violations['duplicate order_id'] += 1
+            if order['user_id'] not in key_filters['users']:
+                violations['unknown user_id'] += 1
+            if order['store_id'] not in key_filters['stores']:
+                violations['unknown store_id'] += 1
+            for item in order['items']:
+                if item_filter.add(item['item_id']):
+                    violations['duplicate item_id'] += 1
+                if item['product_id'] not in key_filters['products']:
+                    violations['unknown product_id'] += 1
+                elif order['store_id'] + '|' + item['product_id'] not in key_filters['stockedby']:
+                    violations['product not stocked by store'] += 1
+
+            # All of our times share the same ISO format, so we can compare them as strings.
+            if last_time_placed is not None and order['time_placed'] < last_time_placed:
+                violations['decreasing time_placed'] += 1
+            last_time_placed = order['time_placed']
+            update_field_counts(field_counts, order)
+
+    check_filter_capacity(report, 'order_id', order_filter)
+    check_filter_capacity(report, 'item_id', item_filter)
+    report['field_counts'] = field_counts
+    return report
+
+
+def sample_expected_rates(null_predicate, missing_predicate, samples):
+    # We can't read the probability out of each predicate, so we sample it. Our generator applies NULL before missing
+    # (and a missing field is removed even if it was NULL), so we expect NULL at p_null * (1 - p_missing) and missing
+    # at p_missing. We sample both predicates together here to get these rates directly.
+    null_count, missing_count = 0, 0
+    for _ in range(samples):
+        is_null = null_predicate is not None and null_predicate()
+        if missing_predicate is not None and missing_predicate():
+            missing_count = missing_count + 1
+        elif is_null:
+            null_count = null_count + 1
+    return {'null': null_count / samples, 'missing': missing_count / samples}
+
+
+def standard_error(rate, count):
+    return math.sqrt(rate * (1 - rate) / count) if count > 0 else 0.0
+
+
+def print_report(report, samples):
+    module = DATASET_MODULES[report['dataset']]
+    print('[{}] {} records'.format(report['dataset'], report['records']))
+    for violation, count in report['violations'].items():
+        print('  {:<32} {}'.format(violation, count))
+    for warning in report['warnings']:
+        print('  warning: ' + warning)
+
+    for field, counts in report['field_counts'].items():
+        expected_rates = sample_expected_rates(module.NULL_DISTRIBUTIONS.get(field),
+                                               module.MISSING_DISTRIBUTIONS.get(field), samples)
+        for kind, distributions in [('null', module.NULL_DISTRIBUTIONS), ('missing', module.MISSING_DISTRIBUTIONS)]:
+            if field not in distributions:
+                continue
+            expected_rate = expected_rates[kind]
+            observed_rate = counts[kind] / report['records'] if report['records'] > 0 else 0.0
+            print('  {:<32} sampled expected {:.4f} +/- {:.4f}, observed {:.4f} +/- {:.4f}'.format(
+                field + ' (' + kind + ')', expected_rate, standard_error(expected_rate, samples),
+                observed_rate, standard_error(observed_rate, report['records'])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validate the generated datasets.')
+    parser.add_argument('--users_file', default='users.json', help='Location of the Users dataset.')
+    parser.add_argument('--stores_file', default='stores.json', help='Location of the Stores dataset.')
+    parser.add_argument('--products_file', default='products.json', help='Location of the Products dataset.')
+    parser.add_argument('--stocked_file', default='stockedby.json', help='Location of the StockedBy dataset.')
+    parser.add_argument('--orders_file', default='orders.json', help='Location of the Orders dataset.')
+    parser.add_argument('--error_rate', type=float, default=1e-6, help='False positive rate of our Bloom filters.')
+    parser.add_argument('--config_samples', type=int, default=100000,
+                        help='Number of samples used to estimate the expected null / missing rates.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes used to scan the files.')
+    parser.add_argument('--random_seed', default=0, help='Seed used for the random package.')
+    arguments = parser.parse_args()
+    random.seed(arguments.random_seed)
+
+    # Scan each of our reference datasets in parallel, keeping only a Bloom filter of their keys.
+    reference_files = {
+        'users': arguments.users_file,
+        'stores': arguments.stores_file,
+        'products': arguments.products_file,
+        'stockedby': arguments.stocked_file
+    }
+    reports, reference_filters = [], {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=arguments.workers) as executor:
+        futures = {k: executor.submit(scan_reference_file, k, v, arguments.error_rate)
+                   for k, v in reference_files.items()}
+        for k, v in futures.items():
+            reference_report, reference_filter = v.result()
+            reports.append(reference_report)
+            reference_filters[k] = reference_filter
+
+    # Our orders depend on all of the reference datasets, so these are scanned last.
+    reports.append(scan_orders_file(arguments.orders_file, reference_filters, arguments.error_rate))
+    for report in reports:
+        print_report(report, arguments.config_samples)
+
+    # Note: duplicates may be false positives (at our error rate), and unknown keys may be under-counted.
+    print('Bloom filter false positive rate: {}'.format(arguments.error_rate))
+    sys.exit(1 if any(c > 0 for r in reports for c in r['violations'].values()) else 0)